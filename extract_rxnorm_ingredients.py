@@ -27,8 +27,10 @@ Notes:
 from __future__ import annotations
 
 import argparse
+import heapq
 import http.server
 import json
+import mmap
 import os
 import socketserver
 import sys
@@ -37,14 +39,30 @@ import urllib.request
 import urllib.parse
 import webbrowser
 import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import partial
 from threading import Thread
 from time import sleep
-from typing import Iterable, Dict, Any, Tuple, Set, List
+from typing import DefaultDict, Iterable, Iterator, Dict, Any, Tuple, Set, List
+
+try:
+    import orjson  # optional: much faster JSON output; falls back to the stdlib encoder
+except ImportError:
+    orjson = None
 
 
 TARGET_SAB = "RXNORM"
 TARGET_TTYS = {"IN", "PIN", "MIN"}
+# RRF files are parsed in binary mode; compared fields are ASCII, so compare raw bytes.
+B_RXNORM = TARGET_SAB.encode("ascii")
+B_MTHSPL = b"MTHSPL"
+B_SU = b"SU"
+B_CUI = b"CUI"
+B_NDC = b"NDC"
+B_N = b"N"
+B_P = b"P"
+B_ENG = b"ENG"
 RXN_ZIP_URL = "https://download.nlm.nih.gov/rxnorm/RxNorm_full_prescribe_current.zip"
 
 
@@ -104,151 +122,164 @@ def start_http_server(directory: str, preferred_port: int = 8000) -> tuple[socke
     raise OSError("Could not bind an HTTP port")
 
 
-def _choose_name(existing: Tuple[str, str] | None, candidate: Tuple[str, str]) -> Tuple[str, str]:
-    """Pick a better (TS, STR) pair, preferring TS='P'."""
-    if existing is None:
-        return candidate
-    ts1, _ = existing
-    ts2, _ = candidate
-    if ts1 == 'P':
-        return existing
-    if ts2 == 'P':
-        return candidate
-    return existing
+def iter_rrf_lines(path: str) -> Iterator[bytes]:
+    """Yield the lines of an RRF file (newline included) from a read-only memory map."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return  # an empty file cannot be mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            yield from iter(mm.readline, b"")
+
+
+def _update_best_name(names: Dict[int, str], has_p: Set[int], rxcui: int, ts: bytes, name: bytes) -> None:
+    """Record STR for rxcui, preferring the first TS='P' name over earlier non-preferred ones.
+
+    has_p holds the RXCUIs whose name already came from a TS='P' row.
+    """
+    if rxcui in has_p:
+        return
+    if ts == B_P:
+        names[rxcui] = name.decode("utf-8", "replace")
+        has_p.add(rxcui)
+    elif rxcui not in names:
+        names[rxcui] = name.decode("utf-8", "replace")
 
 
 def scan_rxnconso(path: str, only_eng: bool = False) -> Tuple[
-    Dict[str, Dict[str, str]],  # ingredients
-    Dict[str, str],             # scdc_names
-    Dict[str, str],             # unii_map
-    Set[str],                   # scdc_set
-    Dict[str, str],             # scd_names
-    Set[str],                   # scd_set
-    Set[str],                   # in_set
-    Set[str],                   # pin_set
-    Set[str],                   # min_set
-    Dict[str, str],             # gpck_names
-    Set[str],                   # gpck_set
-    Dict[str, str],             # bpck_names
-    Set[str],                   # bpck_set
-    Dict[str, str],             # sbd_names
-    Set[str],                   # sbd_set
-    Dict[str, str],             # bn_names
-    Set[str],                   # bn_set
+    Dict[int, str],             # ing_name
+    Dict[int, str],             # ing_tty
+    Dict[int, str],             # scdc_names
+    Dict[int, str],             # unii_map
+    Set[int],                   # scdc_set
+    Dict[int, str],             # scd_names
+    Set[int],                   # scd_set
+    Set[int],                   # in_set
+    Set[int],                   # pin_set
+    Set[int],                   # min_set
+    Dict[int, str],             # gpck_names
+    Set[int],                   # gpck_set
+    Dict[int, str],             # bpck_names
+    Set[int],                   # bpck_set
+    Dict[int, str],             # sbd_names
+    Set[int],                   # sbd_set
+    Dict[int, str],             # bn_names
+    Set[int],                   # bn_set
 ]:
     """
     Scan RXNCONSO once and return:
-      - ingredients: rxcui -> { 'name': str, 'tty': str }
+      - ing_name, ing_tty: rxcui -> name and TTY for the ingredients (IN/PIN/MIN)
       - scdc_names: rxcui -> name (for SAB=RXNORM, TTY=SCDC)
       - unii_map: rxcui(IN/PIN/MIN) -> UNII code (via SAB=MTHSPL, TTY=SU, CODE)
       - scdc_set: set of RXCUI that are SCDC (for robust joining even if name missing)
       - scd_names: rxcui -> name (for SAB=RXNORM, TTY=SCD)
       - scd_set: set of RXCUI that are SCD
+    RXCUIs are interned as int (they are always decimal in RxNorm); names and codes are decoded to str.
     """
-    ingredients: Dict[str, Dict[str, str]] = {}
-    ing_best_name: Dict[str, Tuple[str, str]] = {}
-    scdc_names_best: Dict[str, Tuple[str, str]] = {}
-    unii_map: Dict[str, str] = {}
-    scdc_set: Set[str] = set()
-    scd_names_best: Dict[str, Tuple[str, str]] = {}
-    scd_set: Set[str] = set()
-    in_set: Set[str] = set()
-    pin_set: Set[str] = set()
-    min_set: Set[str] = set()
-    gpck_names_best: Dict[str, Tuple[str, str]] = {}
-    gpck_set: Set[str] = set()
-    bpck_names_best: Dict[str, Tuple[str, str]] = {}
-    bpck_set: Set[str] = set()
-    sbd_names_best: Dict[str, Tuple[str, str]] = {}
-    sbd_set: Set[str] = set()
-    bn_names_best: Dict[str, Tuple[str, str]] = {}
-    bn_set: Set[str] = set()
-
-    with open(path, "r", encoding="utf-8", errors="replace") as f:
-        for line_no, line in enumerate(f, start=1):
-            parts = line.rstrip("\n").split("|")
-            if len(parts) < 18:
-                continue
-            rxcui = parts[0]
-            lat = parts[1]
-            ts = parts[2]
-            sab = parts[11]
-            tty = parts[12]
-            code = parts[13]
-            name = parts[14]
-            suppress = parts[16] if len(parts) > 16 else ""
-
-            if not rxcui:
+    ing_tty: Dict[int, str] = {}
+    ing_name: Dict[int, str] = {}
+    ing_has_p: Set[int] = set()
+    scdc_names: Dict[int, str] = {}
+    scdc_has_p: Set[int] = set()
+    unii_map: Dict[int, str] = {}
+    scdc_set: Set[int] = set()
+    scd_names: Dict[int, str] = {}
+    scd_has_p: Set[int] = set()
+    scd_set: Set[int] = set()
+    in_set: Set[int] = set()
+    pin_set: Set[int] = set()
+    min_set: Set[int] = set()
+    gpck_names: Dict[int, str] = {}
+    gpck_has_p: Set[int] = set()
+    gpck_set: Set[int] = set()
+    bpck_names: Dict[int, str] = {}
+    bpck_has_p: Set[int] = set()
+    bpck_set: Set[int] = set()
+    sbd_names: Dict[int, str] = {}
+    sbd_has_p: Set[int] = set()
+    sbd_set: Set[int] = set()
+    bn_names: Dict[int, str] = {}
+    bn_has_p: Set[int] = set()
+    bn_set: Set[int] = set()
+    # TTY -> (concept set, names, RXCUIs named from a TS='P' row) for the non-ingredient concepts
+    tty_targets: Dict[bytes, Tuple[Set[int], Dict[int, str], Set[int]]] = {
+        b"SCDC": (scdc_set, scdc_names, scdc_has_p),
+        b"SCD": (scd_set, scd_names, scd_has_p),
+        b"GPCK": (gpck_set, gpck_names, gpck_has_p),
+        b"BPCK": (bpck_set, bpck_names, bpck_has_p),
+        b"SBD": (sbd_set, sbd_names, sbd_has_p),
+        b"BN": (bn_set, bn_names, bn_has_p),
+    }
+    ing_tty_sets: Dict[bytes, Tuple[Set[int], str]] = {
+        b"IN": (in_set, "IN"),
+        b"PIN": (pin_set, "PIN"),
+        b"MIN": (min_set, "MIN"),
+    }
+
+    for line in iter_rrf_lines(path):
+        # Split through TTY first: only SAB=RXNORM and MTHSPL/SU rows are used,
+        # so everything else is rejected before the rest of the line is split.
+        head = line.split(b"|", 13)
+        if len(head) < 14:
+            continue
+        sab = head[11]
+        tty = head[12]
+        if sab != B_RXNORM and (sab != B_MTHSPL or tty != B_SU):
+            continue
+        # CODE, STR, SRL, SUPPRESS; CVF and the trailing empty field stay unsplit
+        tail = head[13].split(b"|", 4)
+        if len(tail) < 5:
+            continue
+        if not head[0]:
+            continue
+        rxcui = int(head[0])
+        lat = head[1]
+        ts = head[2]
+        code = tail[0]
+        name = tail[1]
+        suppress = tail[3]
+
+        if sab == B_RXNORM:
+            entry = tty_targets.get(tty)
+            if entry is not None:
+                cui_set, names, has_p = entry
+                if suppress != B_N:
+                    continue
+                cui_set.add(rxcui)
+                # Always capture the name if available; if only_eng, prefer ENG but still keep others if ENG absent
+                if not only_eng or lat == B_ENG:
+                    _update_best_name(names, has_p, rxcui, ts, name)
                 continue
-
-            if sab == TARGET_SAB:
-                if tty in TARGET_TTYS:
-                    # Exclude suppressed concepts (SUPPRESS must be 'N')
-                    if suppress != 'N':
-                        continue
-                    if only_eng and lat != "ENG":
-                        continue
-                    ing_best_name[rxcui] = _choose_name(ing_best_name.get(rxcui), (ts, name))
-                    ingredients.setdefault(rxcui, {"tty": tty, "name": name})
-                    _, name_best = ing_best_name[rxcui]
-                    ingredients[rxcui]["name"] = name_best
-                    ingredients[rxcui]["tty"] = tty
-                    if tty == "IN":
-                        in_set.add(rxcui)
-                    elif tty == "PIN":
-                        pin_set.add(rxcui)
-                    elif tty == "MIN":
-                        min_set.add(rxcui)
-
-                elif tty == "SCDC":
-                    if suppress != 'N':
-                        continue
-                    scdc_set.add(rxcui)
-                    # Always capture the name if available; if only_eng, prefer ENG but still keep others if ENG absent
-                    if not only_eng or lat == "ENG":
-                        scdc_names_best[rxcui] = _choose_name(scdc_names_best.get(rxcui), (ts, name))
-                elif tty == "SCD":
-                    if suppress != 'N':
-                        continue
-                    scd_set.add(rxcui)
-                    if not only_eng or lat == "ENG":
-                        scd_names_best[rxcui] = _choose_name(scd_names_best.get(rxcui), (ts, name))
-                elif tty == "GPCK":
-                    if suppress != 'N':
-                        continue
-                    gpck_set.add(rxcui)
-                    if not only_eng or lat == "ENG":
-                        gpck_names_best[rxcui] = _choose_name(gpck_names_best.get(rxcui), (ts, name))
-                elif tty == "BPCK":
-                    if suppress != 'N':
-                        continue
-                    bpck_set.add(rxcui)
-                    if not only_eng or lat == "ENG":
-                        bpck_names_best[rxcui] = _choose_name(bpck_names_best.get(rxcui), (ts, name))
-                elif tty == "SBD":
-                    if suppress != 'N':
-                        continue
-                    sbd_set.add(rxcui)
-                    if not only_eng or lat == "ENG":
-                        sbd_names_best[rxcui] = _choose_name(sbd_names_best.get(rxcui), (ts, name))
-                elif tty == "BN":
-                    if suppress != 'N':
-                        continue
-                    bn_set.add(rxcui)
-                    if not only_eng or lat == "ENG":
-                        bn_names_best[rxcui] = _choose_name(bn_names_best.get(rxcui), (ts, name))
-
-            if sab == "MTHSPL" and tty == "SU" and code:
-                unii_map.setdefault(rxcui, code)
-
-    scdc_names: Dict[str, str] = {cui: pair[1] for cui, pair in scdc_names_best.items()}
-    scd_names: Dict[str, str] = {cui: pair[1] for cui, pair in scd_names_best.items()}
-    gpck_names: Dict[str, str] = {cui: pair[1] for cui, pair in gpck_names_best.items()}
-    bpck_names: Dict[str, str] = {cui: pair[1] for cui, pair in bpck_names_best.items()}
-    sbd_names: Dict[str, str] = {cui: pair[1] for cui, pair in sbd_names_best.items()}
-    bn_names: Dict[str, str] = {cui: pair[1] for cui, pair in bn_names_best.items()}
+            ing_entry = ing_tty_sets.get(tty)
+            if ing_entry is not None:
+                # Exclude suppressed concepts (SUPPRESS must be 'N')
+                if suppress != B_N:
+                    continue
+                if only_eng and lat != B_ENG:
+                    continue
+                _update_best_name(ing_name, ing_has_p, rxcui, ts, name)
+                ing_cui_set, ing_tty[rxcui] = ing_entry
+                ing_cui_set.add(rxcui)
+        elif code and rxcui not in unii_map:
+            # SAB=MTHSPL, TTY=SU (all other rows were rejected above)
+            unii_map[rxcui] = code.decode("utf-8", "replace")
+
+    # Every concept in a set gets a name ("" if it had none usable) so callers can
+    # index the name maps directly, e.g. key=scd_names.__getitem__ when sorting.
+    for names, cui_set in (
+        (scdc_names, scdc_set),
+        (scd_names, scd_set),
+        (gpck_names, gpck_set),
+        (bpck_names, bpck_set),
+        (sbd_names, sbd_set),
+        (bn_names, bn_set),
+    ):
+        for cui in cui_set - names.keys():
+            names[cui] = ""
     return (
-        ingredients,
+        ing_name,
+        ing_tty,
         scdc_names,
         unii_map,
         scdc_set,
@@ -268,259 +299,334 @@ def scan_rxnconso(path: str, only_eng: bool = False) -> Tuple[
     )
 
 
-def scan_rxnrel_for_scdc(path: str, ingredient_set: Set[str], scdc_cui_set: Set[str], pin_set: Set[str]) -> Dict[str, Set[str]]:
-    """Map ingredient RXCUI -> set of SCDC RXCUIs via RXNREL.
-
-    Handles:
-      - IN/MIN: RELA in {has_ingredient, ingredient_of}
-      - PIN: RELA in {has_precise_ingredient, precise_ingredient_of}
+def iter_rxnrel(path: str) -> Iterator[Tuple[bytes, bytes, bytes]]:
+    """Yield (RXCUI1, RXCUI2, RELA) for RXNREL rows with SAB=RXNORM and STYPE1=STYPE2=CUI."""
+    for line in iter_rrf_lines(path):
+        # Only fields [0]..[10] are needed; stop splitting after SAB.
+        parts = line.split(b"|", 11)
+        if len(parts) < 12:
+            continue
+        if parts[10] != B_RXNORM:
+            continue
+        if parts[2] != B_CUI or parts[6] != B_CUI:
+            continue
+        yield parts[0], parts[4], parts[7]
+
+
+# Concept kinds as bit flags; an RXCUI's kind is the OR of every RXNCONSO set it is in.
+K_IN = 1 << 0
+K_PIN = 1 << 1
+K_MIN = 1 << 2
+K_SCDC = 1 << 3
+K_SCD = 1 << 4
+K_GPCK = 1 << 5
+K_BPCK = 1 << 6
+K_SBD = 1 << 7
+K_BN = 1 << 8
+K_ING = K_IN | K_PIN | K_MIN
+
+# RXNREL RELA values used by scan_rxnrel_all, grouped by how the row is handled
+REL_HAS_INGREDIENT = 1   # IN/MIN <-> SCDC, BN <-> SBD, MIN <-> IN/SCD
+REL_INGREDIENT_OF = 2    # IN/MIN <-> SCDC, BN <-> SBD
+REL_INGREDIENTS = 3      # MIN <-> IN/SCD
+REL_PRECISE = 4          # PIN <-> SCDC, IN <-> PIN
+REL_CONSTITUTES = 5      # SCD <-> SCDC
+REL_CONTAINS = 6         # SCD <-> GPCK/BPCK
+REL_TRADENAME = 7        # SCD <-> SBD
+RELA_TO_KIND: Dict[bytes, int] = {
+    b"has_ingredient": REL_HAS_INGREDIENT,
+    b"ingredient_of": REL_INGREDIENT_OF,
+    b"has_ingredients": REL_INGREDIENTS,
+    b"ingredients_of": REL_INGREDIENTS,
+    b"has_precise_ingredient": REL_PRECISE,
+    b"precise_ingredient_of": REL_PRECISE,
+    b"constitutes": REL_CONSTITUTES,
+    b"contains": REL_CONTAINS,
+    b"contained_in": REL_CONTAINS,
+    b"has_tradename": REL_TRADENAME,
+    b"tradename_of": REL_TRADENAME,
+}
+
+
+def _concept_kinds(*sets_and_flags: Tuple[Set[int], int]) -> Dict[int, int]:
+    """Build RXCUI -> OR of the flags of every (set, flag) pair whose set contains it."""
+    kind: Dict[int, int] = {}
+    for cui_set, flag in sets_and_flags:
+        for cui in cui_set:
+            kind[cui] = kind.get(cui, 0) | flag
+    return kind
+
+
+def _dedup_edges(edges: Dict[int, List[int]]) -> Dict[int, Set[int]]:
+    """Collapse per-concept edge lists (which may repeat targets) into sets."""
+    return {cui: set(targets) for cui, targets in edges.items()}
+
+
+def scan_rxnrel_all(
+    path: str,
+    in_set: Set[int],
+    pin_set: Set[int],
+    min_set: Set[int],
+    scdc_set: Set[int],
+    scd_set: Set[int],
+    gpck_set: Set[int],
+    bpck_set: Set[int],
+    sbd_set: Set[int],
+    bn_set: Set[int],
+) -> Tuple[
+    Dict[int, Set[int]],  # ing_to_scdc
+    Dict[int, Set[int]],  # scdc_to_scds
+    Dict[int, Set[int]],  # pin_to_scdc
+    Dict[int, Set[int]],  # min_to_scdc
+    Dict[int, Set[int]],  # scd_to_gpck
+    Dict[int, Set[int]],  # scd_to_bpck
+    Dict[int, Set[int]],  # scd_to_sbd
+    Dict[int, Set[int]],  # sbd_to_bn
+]:
     """
-    ing_to_scdc: Dict[str, Set[str]] = {cui: set() for cui in ingredient_set}
-    with open(path, "r", encoding="utf-8", errors="replace") as f:
-        for line_no, line in enumerate(f, start=1):
-            parts = line.rstrip("\n").split("|")
-            if len(parts) < 16:
-                continue
-            c1 = parts[0]
-            st1 = parts[2]
-            rel = parts[3]
-            c2 = parts[4]
-            st2 = parts[6]
-            rela = parts[7]
-            sab = parts[10]
-
-            if sab != TARGET_SAB:
-                continue
-            if st1 != "CUI" or st2 != "CUI":
-                continue
+    Scan RXNREL once and return:
+      - ing_to_scdc: IN/PIN/MIN -> SCDCs (has_ingredient/ingredient_of; PIN via has_precise_ingredient/precise_ingredient_of)
+      - scdc_to_scds: SCDC -> SCDs (constitutes)
+      - pin_to_scdc: PIN -> SCDCs inherited from INs related by has_precise_ingredient/precise_ingredient_of
+      - min_to_scdc: MIN -> SCDCs inherited from INs/SCDs related by has_ingredient/has_ingredients/ingredients_of
+      - scd_to_gpck, scd_to_bpck: SCD -> packs (contains/contained_in)
+      - scd_to_sbd: SCD -> SBDs (has_tradename/tradename_of)
+      - sbd_to_bn: SBD -> BNs (has_ingredient/ingredient_of)
+    """
+    # One hash table for the whole join: each row probes it once per side
+    # instead of probing every concept set the RELA could involve.
+    kind = _concept_kinds(
+        (in_set, K_IN),
+        (pin_set, K_PIN),
+        (min_set, K_MIN),
+        (scdc_set, K_SCDC),
+        (scd_set, K_SCD),
+        (gpck_set, K_GPCK),
+        (bpck_set, K_BPCK),
+        (sbd_set, K_SBD),
+        (bn_set, K_BN),
+    )
 
-            if rela in {"has_ingredient", "ingredient_of"}:
-                if c1 in ingredient_set and c2 in scdc_cui_set:
-                    ing_to_scdc[c1].add(c2)
-                elif c2 in ingredient_set and c1 in scdc_cui_set:
-                    ing_to_scdc[c2].add(c1)
-            elif rela in {"has_precise_ingredient", "precise_ingredient_of"}:
-                # direct PIN <-> SCDC
-                if c1 in pin_set and c2 in scdc_cui_set:
-                    ing_to_scdc[c1].add(c2)
-                elif c2 in pin_set and c1 in scdc_cui_set:
-                    ing_to_scdc[c2].add(c1)
-
-    return ing_to_scdc
-
-
-def scan_rxnrel_for_scds(path: str, scdc_cui_set: Set[str], scd_cui_set: Set[str]) -> Dict[str, Set[str]]:
-    """Map SCDC RXCUI -> set of SCD RXCUIs via RXNREL (RELA constitutes)."""
-    scdc_to_scds: Dict[str, Set[str]] = {cui: set() for cui in scdc_cui_set}
-    with open(path, "r", encoding="utf-8", errors="replace") as f:
-        for line_no, line in enumerate(f, start=1):
-            parts = line.rstrip("\n").split("|")
-            if len(parts) < 16:
-                continue
-            c1 = parts[0]
-            st1 = parts[2]
-            rel = parts[3]
-            c2 = parts[4]
-            st2 = parts[6]
-            rela = parts[7]
-            sab = parts[10]
-
-            if sab != TARGET_SAB:
-                continue
-            if st1 != "CUI" or st2 != "CUI":
-                continue
-            if rela != "constitutes":
-                continue
+    # Edge lists are only allocated for concepts that have an edge, and
+    # deduplicated into sets once the scan is done.
+    ing_to_scdc_l: DefaultDict[int, List[int]] = defaultdict(list)
+    scdc_to_scds_l: DefaultDict[int, List[int]] = defaultdict(list)
+    scd_to_scdc_l: DefaultDict[int, List[int]] = defaultdict(list)
+    scd_to_gpck_l: DefaultDict[int, List[int]] = defaultdict(list)
+    scd_to_bpck_l: DefaultDict[int, List[int]] = defaultdict(list)
+    scd_to_sbd_l: DefaultDict[int, List[int]] = defaultdict(list)
+    sbd_to_bn_l: DefaultDict[int, List[int]] = defaultdict(list)
+    # PIN/MIN inherit SCDCs from INs (and MIN also from SCDs), which are only
+    # complete once the whole file has been read: record the edges, resolve after.
+    pin_from_in: List[Tuple[int, int]] = []
+    min_from_in: List[Tuple[int, int]] = []
+    min_from_scd: List[Tuple[int, int]] = []
+
+    rela_to_kind = RELA_TO_KIND
+    for rxcui1, rxcui2, rela in iter_rxnrel(path):
+        rk = rela_to_kind.get(rela)
+        if rk is None:
+            continue
+        # Every RELA joins two known concepts; drop rows touching any other RXCUI
+        c1 = int(rxcui1)
+        k1 = kind.get(c1)
+        if k1 is None:
+            continue
+        c2 = int(rxcui2)
+        k2 = kind.get(c2)
+        if k2 is None:
+            continue
 
+        if rk == REL_CONSTITUTES:
             # Either side can be SCDC; the other should be SCD
-            if c1 in scd_cui_set and c2 in scdc_cui_set:
-                scdc_to_scds[c2].add(c1)
-            elif c2 in scd_cui_set and c1 in scdc_cui_set:
-                scdc_to_scds[c1].add(c2)
-
-    return scdc_to_scds
-
-
-def scan_rxnrel_for_packs_sbd(
-    path: str,
-    scd_cui_set: Set[str],
-    gpck_set: Set[str],
-    bpck_set: Set[str],
-    sbd_set: Set[str],
-) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]], Dict[str, Set[str]]]:
-    """Map SCD RXCUI -> sets of GPCK, BPCK, and SBD RXCUIs via RXNREL.
-
-    - Packs: RELA in {contains, contained_in}
-    - Brands (SBD): RELA in {has_tradename, tradename_of}
-    """
-    scd_to_gpck: Dict[str, Set[str]] = {cui: set() for cui in scd_cui_set}
-    scd_to_bpck: Dict[str, Set[str]] = {cui: set() for cui in scd_cui_set}
-    scd_to_sbd: Dict[str, Set[str]] = {cui: set() for cui in scd_cui_set}
-
-    with open(path, "r", encoding="utf-8", errors="replace") as f:
-        for line_no, line in enumerate(f, start=1):
-            parts = line.rstrip("\n").split("|")
-            if len(parts) < 16:
-                continue
-            c1 = parts[0]
-            st1 = parts[2]
-            rel = parts[3]
-            c2 = parts[4]
-            st2 = parts[6]
-            rela = parts[7]
-            sab = parts[10]
-
-            if sab != TARGET_SAB or st1 != "CUI" or st2 != "CUI":
-                continue
+            if k1 & K_SCD and k2 & K_SCDC:
+                scdc_to_scds_l[c2].append(c1)
+                scd_to_scdc_l[c1].append(c2)
+            elif k2 & K_SCD and k1 & K_SCDC:
+                scdc_to_scds_l[c1].append(c2)
+                scd_to_scdc_l[c2].append(c1)
+        elif rk == REL_TRADENAME:
+            if k1 & K_SCD and k2 & K_SBD:
+                scd_to_sbd_l[c1].append(c2)
+            elif k2 & K_SCD and k1 & K_SBD:
+                scd_to_sbd_l[c2].append(c1)
+        elif rk == REL_CONTAINS:
+            if k1 & K_SCD and k2 & K_GPCK:
+                scd_to_gpck_l[c1].append(c2)
+            elif k2 & K_SCD and k1 & K_GPCK:
+                scd_to_gpck_l[c2].append(c1)
+            if k1 & K_SCD and k2 & K_BPCK:
+                scd_to_bpck_l[c1].append(c2)
+            elif k2 & K_SCD and k1 & K_BPCK:
+                scd_to_bpck_l[c2].append(c1)
+        elif rk == REL_PRECISE:
+            # direct PIN <-> SCDC
+            if k1 & K_PIN and k2 & K_SCDC:
+                ing_to_scdc_l[c1].append(c2)
+            elif k2 & K_PIN and k1 & K_SCDC:
+                ing_to_scdc_l[c2].append(c1)
+            # IN <-> PIN (exclude form_of/has_form to avoid over-propagation)
+            if k1 & K_IN and k2 & K_PIN:
+                pin_from_in.append((c2, c1))
+            elif k2 & K_IN and k1 & K_PIN:
+                pin_from_in.append((c1, c2))
+        else:
+            if rk != REL_INGREDIENTS:
+                # IN/MIN <-> SCDC
+                if k1 & K_ING and k2 & K_SCDC:
+                    ing_to_scdc_l[c1].append(c2)
+                elif k2 & K_ING and k1 & K_SCDC:
+                    ing_to_scdc_l[c2].append(c1)
+                # BN has_ingredient SBD, or SBD ingredient_of BN
+                if k1 & K_BN and k2 & K_SBD:
+                    sbd_to_bn_l[c2].append(c1)
+                elif k2 & K_BN and k1 & K_SBD:
+                    sbd_to_bn_l[c1].append(c2)
+            if rk != REL_INGREDIENT_OF:
+                # MIN may link directly to IN or to SCD; support both
+                if k1 & K_MIN and k2 & K_IN:
+                    min_from_in.append((c1, c2))
+                elif k2 & K_MIN and k1 & K_IN:
+                    min_from_in.append((c2, c1))
+                elif k1 & K_MIN and k2 & K_SCD:
+                    min_from_scd.append((c1, c2))
+                elif k2 & K_MIN and k1 & K_SCD:
+                    min_from_scd.append((c2, c1))
+
+    ing_to_scdc = _dedup_edges(ing_to_scdc_l)
+    scd_to_scdc = _dedup_edges(scd_to_scdc_l)
+
+    pin_to_scdc: DefaultDict[int, List[int]] = defaultdict(list)
+    min_to_scdc: DefaultDict[int, List[int]] = defaultdict(list)
+    empty: Set[int] = set()
+    for pin, ing in pin_from_in:
+        pin_to_scdc[pin].extend(ing_to_scdc.get(ing, empty))
+    for mn, ing in min_from_in:
+        min_to_scdc[mn].extend(ing_to_scdc.get(ing, empty))
+    for mn, scd in min_from_scd:
+        min_to_scdc[mn].extend(scd_to_scdc.get(scd, empty))
 
-            # Packs
-            if rela in {"contains", "contained_in"}:
-                # normalize so scd is on left variable scd, pack is pk
-                if c1 in scd_cui_set and c2 in gpck_set:
-                    scd_to_gpck[c1].add(c2)
-                elif c2 in scd_cui_set and c1 in gpck_set:
-                    scd_to_gpck[c2].add(c1)
-                if c1 in scd_cui_set and c2 in bpck_set:
-                    scd_to_bpck[c1].add(c2)
-                elif c2 in scd_cui_set and c1 in bpck_set:
-                    scd_to_bpck[c2].add(c1)
-
-            # Brands
-            if rela in {"has_tradename", "tradename_of"}:
-                if c1 in scd_cui_set and c2 in sbd_set:
-                    scd_to_sbd[c1].add(c2)
-                elif c2 in scd_cui_set and c1 in sbd_set:
-                    scd_to_sbd[c2].add(c1)
-
-    return scd_to_gpck, scd_to_bpck, scd_to_sbd
-
-
-def scan_rxnrel_for_sbd_bn(
-    path: str,
-    sbd_set: Set[str],
-    bn_set: Set[str],
-) -> Dict[str, Set[str]]:
-    """Map SBD RXCUI -> set of BN RXCUIs via has_ingredient/ingredient_of (SAB=RXNORM)."""
-    sbd_to_bn: Dict[str, Set[str]] = {cui: set() for cui in sbd_set}
-    with open(path, "r", encoding="utf-8", errors="replace") as f:
-        for line_no, line in enumerate(f, start=1):
-            parts = line.rstrip("\n").split("|")
-            if len(parts) < 16:
-                continue
-            c1 = parts[0]
-            st1 = parts[2]
-            c2 = parts[4]
-            st2 = parts[6]
-            rela = parts[7]
-            sab = parts[10]
-            if sab != TARGET_SAB or st1 != "CUI" or st2 != "CUI":
-                continue
-            if rela not in {"has_ingredient", "ingredient_of"}:
-                continue
-            # BN has_ingredient SBD, or SBD ingredient_of BN
-            if c1 in bn_set and c2 in sbd_set:
-                sbd_to_bn[c2].add(c1)
-            elif c2 in bn_set and c1 in sbd_set:
-                sbd_to_bn[c1].add(c2)
-    return sbd_to_bn
+    return (
+        ing_to_scdc,
+        _dedup_edges(scdc_to_scds_l),
+        _dedup_edges(pin_to_scdc),
+        _dedup_edges(min_to_scdc),
+        _dedup_edges(scd_to_gpck_l),
+        _dedup_edges(scd_to_bpck_l),
+        _dedup_edges(scd_to_sbd_l),
+        _dedup_edges(sbd_to_bn_l),
+    )
 
 
-def scan_rxnsat_ndc_rxnorm(path: str) -> Dict[str, Set[str]]:
-    """Return mapping CUI -> set of NDC strings where RXNSAT has SAB=RXNORM and ATN='NDC'.
+def scan_rxnsat_ndc_rxnorm(path: str) -> Dict[int, List[str]]:
+    """Return mapping CUI -> sorted, deduplicated NDC strings where RXNSAT has SAB=RXNORM and ATN='NDC'.
 
     RXNSAT fields:
       [0] CUI, [1] LUI, [2] SUI, [3] METAUI, [4] STYPE, [5] CODE,
       [6] ATUI, [7] SATUI, [8] ATN, [9] SAB, [10] ATV, [11] SUPPRESS, [12] CVF
     """
-    ndc_map: Dict[str, Set[str]] = {}
+    raw: DefaultDict[int, List[bytes]] = defaultdict(list)
     try:
-        with open(path, "r", encoding="utf-8", errors="replace") as f:
-            for line_no, line in enumerate(f, start=1):
-                parts = line.rstrip("\n").split("|")
-                if len(parts) < 13:
-                    continue
-                cui = parts[0]
-                atn = parts[8]
-                sab = parts[9]
-                atv = parts[10]
-                suppress = parts[11]
-                if sab == TARGET_SAB and atn == 'NDC' and suppress == 'N' and cui and atv:
-                    ndc_map.setdefault(cui, set()).add(atv)
+        for line in iter_rrf_lines(path):
+            parts = line.split(b"|", 12)
+            if len(parts) < 13:
+                continue
+            cui = parts[0]
+            atn = parts[8]
+            sab = parts[9]
+            atv = parts[10]
+            suppress = parts[11]
+            if sab == B_RXNORM and atn == B_NDC and suppress == B_N and cui and atv:
+                raw[int(cui)].append(atv)
     except FileNotFoundError:
         # handled by caller; return empty
         pass
-    return ndc_map
-
-
-def derive_pin_min_scdc(
-    rel_path: str,
-    in_set: Set[str],
-    pin_set: Set[str],
-    min_set: Set[str],
-    ing_to_scdc: Dict[str, Set[str]],
-    scd_set: Set[str],
-    scd_to_scdc: Dict[str, Set[str]],
-) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]]]:
-    """
-    Build SCDC sets for PIN and MIN by propagating from related INs:
-      - PIN: via RELA has_precise_ingredient between IN and PIN
-      - MIN: via RELA has_ingredient/ingredients_of between MIN and IN
-    """
-    pin_to_scdc: Dict[str, Set[str]] = {cui: set() for cui in pin_set}
-    min_to_scdc: Dict[str, Set[str]] = {cui: set() for cui in min_set}
-
-    with open(rel_path, "r", encoding="utf-8", errors="replace") as f:
-        for line_no, line in enumerate(f, start=1):
-            parts = line.rstrip("\n").split("|")
-            if len(parts) < 16:
-                continue
-            c1 = parts[0]
-            st1 = parts[2]
-            rel = parts[3]
-            c2 = parts[4]
-            st2 = parts[6]
-            rela = parts[7]
-            sab = parts[10]
-            if sab != TARGET_SAB or st1 != "CUI" or st2 != "CUI":
-                continue
-
-            # PIN via IN<->PIN relations (exclude form_of/has_form to avoid over-propagation)
-            if rela in {"has_precise_ingredient", "precise_ingredient_of"}:
-                # Identify which side is IN and which is PIN, then inherit SCDCs from IN
-                if c1 in in_set and c2 in pin_set:
-                    pin_to_scdc[c2].update(ing_to_scdc.get(c1, set()))
-                elif c2 in in_set and c1 in pin_set:
-                    pin_to_scdc[c1].update(ing_to_scdc.get(c2, set()))
-
-            # MIN via has_ingredient(s) or ingredients_of
-            if rela in {"has_ingredient", "has_ingredients", "ingredients_of"}:
-                # MIN may link directly to IN or to SCD; support both
-                if c1 in min_set and c2 in in_set:
-                    min_to_scdc[c1].update(ing_to_scdc.get(c2, set()))
-                elif c2 in min_set and c1 in in_set:
-                    min_to_scdc[c2].update(ing_to_scdc.get(c1, set()))
-                elif c1 in min_set and c2 in scd_set:
-                    min_to_scdc[c1].update(scd_to_scdc.get(c2, set()))
-                elif c2 in min_set and c1 in scd_set:
-                    min_to_scdc[c2].update(scd_to_scdc.get(c1, set()))
-
-    return pin_to_scdc, min_to_scdc
+    # Most CUIs have a single NDC: only dedupe and sort the ones with several
+    return {
+        cui: sorted({atv.decode("utf-8", "replace") for atv in atvs}) if len(atvs) > 1 else [atvs[0].decode("utf-8", "replace")]
+        for cui, atvs in raw.items()
+    }
 
 
 def write_json(records: Iterable[Dict[str, Any]], output_path: str, ndjson: bool = False) -> None:
-    if ndjson:
+    if ndjson and orjson is not None:
+        with open(output_path, "wb") as out:
+            for rec in records:
+                out.write(orjson.dumps(rec, option=orjson.OPT_APPEND_NEWLINE))
+    elif ndjson:
         with open(output_path, "w", encoding="utf-8") as out:
             for rec in records:
                 out.write(json.dumps(rec, ensure_ascii=False) + "\n")
     else:
-        data = list(records)
-        with open(output_path, "w", encoding="utf-8") as out:
-            json.dump(data, out, ensure_ascii=False, indent=2)
+        write_json_array_streaming(records, output_path)
+
 
+def write_json_array_streaming(records: Iterable[Dict[str, Any]], output_path: str) -> None:
+    """Write records as a JSON array one record at a time.
 
-def write_web_split(data: List[Dict[str, Any]], out_dir: str) -> None:
+    Output is identical to json.dump(list(records), indent=2, ensure_ascii=False), but
+    neither the list nor any full-document string is held in memory.
+    """
+    if orjson is not None:
+        with open(output_path, "wb") as out:
+            first = True
+            for rec in records:
+                out.write(b"[\n  " if first else b",\n  ")
+                first = False
+                out.write(orjson.dumps(rec, option=orjson.OPT_INDENT_2).replace(b"\n", b"\n  "))
+            out.write(b"[]" if first else b"\n]")
+        return
+    encoder = json.JSONEncoder(ensure_ascii=False, indent=2)
+    with open(output_path, "w", encoding="utf-8") as out:
+        first = True
+        for rec in records:
+            out.write("[\n  " if first else ",\n  ")
+            first = False
+            # Nest each record one level into the array; encoded strings never
+            # contain a raw newline, so every newline is the encoder's own.
+            for chunk in encoder.iterencode(rec):
+                out.write(chunk.replace("\n", "\n  "))
+        out.write("[]" if first else "\n]")
+
+
+def write_json_file(obj: Any, path: str, indent: bool = False) -> None:
+    """Write obj to path as one JSON document (2-space indented if indent)."""
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=2 if indent else None)
+
+
+def record_sort_key(rec: Dict[str, Any]) -> str:
+    """Sort key for output records: case-insensitive Name."""
+    return (rec.get('Name') or '').lower()
+
+
+# Web split bucket for every ASCII first character, so the common case needs no str.upper()
+_ASCII_WEB_BUCKETS: Dict[str, str] = {
+    chr(i): (chr(i).upper() if chr(i).isalpha() else '0-9') for i in range(128)
+}
+
+
+def web_bucket_key(name: str) -> str:
+    """Web split bucket for a Name: its uppercase first letter 'A'..'Z', else '0-9'."""
+    if not name:
+        return '0-9'
+    key = _ASCII_WEB_BUCKETS.get(name[0])
+    if key is not None:
+        return key
+    # Non-ASCII: a few (e.g. dotless 'ı') still uppercase into A-Z
+    ch = name[0].upper()
+    return ch if 'A' <= ch <= 'Z' else '0-9'
+
+
+def write_web_split(buckets: Dict[str, List[Dict[str, Any]]], out_dir: str) -> None:
     """Write lightweight, serverless web assets split by first letter of Name.
 
+    buckets maps web_bucket_key(Name) to that bucket's records, already sorted by record_sort_key.
+
     Produces:
       - <out_dir>/manifest.json: [{ key, label, count, file }]
       - <out_dir>/data/<KEY>.json: array of enriched records for that key
@@ -529,34 +635,24 @@ def write_web_split(data: List[Dict[str, Any]], out_dir: str) -> None:
     import os
     os.makedirs(os.path.join(out_dir, 'data'), exist_ok=True)
 
-    buckets: Dict[str, List[Dict[str, Any]]] = {}
-    def key_for(name: str) -> str:
-        if not name:
-            return '0-9'
-        ch = name[0].upper()
-        return ch if 'A' <= ch <= 'Z' else '0-9'
-
-    for rec in data:
-        k = key_for(rec.get('Name') or '')
-        buckets.setdefault(k, []).append(rec)
-
     manifest = []
-    for k in sorted(buckets.keys(), key=lambda x: ('Z{' if x=='0-9' else x)):
-        arr = buckets[k]
-        # keep per-bucket sorted by Name
-        arr.sort(key=lambda r: (r.get('Name') or '').lower())
-        fname = f"data/{k}.json"
-        with open(os.path.join(out_dir, fname), 'w', encoding='utf-8') as f:
-            json.dump(arr, f, ensure_ascii=False)
-        manifest.append({
-            'key': k,
-            'label': k if k != '0-9' else '0–9',
-            'count': len(arr),
-            'file': fname,
-        })
-
-    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
-        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    # Bucket files are independent; write them concurrently (file writes release the GIL)
+    with ThreadPoolExecutor(max_workers=8) as tp:
+        futures = []
+        for k in sorted(buckets.keys(), key=lambda x: ('Z{' if x=='0-9' else x)):
+            arr = buckets[k]
+            fname = f"data/{k}.json"
+            futures.append(tp.submit(write_json_file, arr, os.path.join(out_dir, fname)))
+            manifest.append({
+                'key': k,
+                'label': k if k != '0-9' else '0–9',
+                'count': len(arr),
+                'file': fname,
+            })
+        for fut in futures:
+            fut.result()
+
+    write_json_file(manifest, os.path.join(out_dir, 'manifest.json'), indent=True)
 
 
 def main() -> int:
@@ -577,52 +673,52 @@ def main() -> int:
         rel_path = os.path.join(rrf_dir, "RXNREL.RRF")
         sat_path = os.path.join(rrf_dir, "RXNSAT.RRF")
 
-        (
-            ingredients,
-            scdc_names,
-            unii_map,
-            scdc_set,
-            scd_names,
-            scd_set,
-            in_set,
-            pin_set,
-            min_set,
-            gpck_names,
-            gpck_set,
-            bpck_names,
-            bpck_set,
-            sbd_names,
-            sbd_set,
-            bn_names,
-            bn_set,
-        ) = scan_rxnconso(input_path, only_eng=only_eng)
-
-        ing_set = set(ingredients.keys())
-        ing_to_scdc = scan_rxnrel_for_scdc(rel_path, ing_set, scdc_set, pin_set)
-        scdc_to_scds = scan_rxnrel_for_scds(rel_path, scdc_set, scd_set)
-        # invert SCDC->SCDs to SCD->SCDC(s)
-        scd_to_scdc: Dict[str, Set[str]] = {}
-        for scdc, scds in scdc_to_scds.items():
-            for scd in scds:
-                scd_to_scdc.setdefault(scd, set()).add(scdc)
-
-        pin_to_scdc, min_to_scdc = derive_pin_min_scdc(
-            rel_path, in_set, pin_set, min_set, ing_to_scdc, scd_set, scd_to_scdc
-        )
-
-        # Packs and brands for SCDs
-        scd_to_gpck, scd_to_bpck, scd_to_sbd = scan_rxnrel_for_packs_sbd(
-            rel_path, scd_set, gpck_set, bpck_set, sbd_set
-        )
-
-        # RXNORM NDCs from RXNSAT
-        cui_to_ndcs = scan_rxnsat_ndc_rxnorm(sat_path)
-
-        # SBD -> BN mapping
-        sbd_to_bn = scan_rxnrel_for_sbd_bn(rel_path, sbd_set, bn_set)
+        # RXNSAT is independent of the other two files: parse it in a worker process
+        # while RXNCONSO and then RXNREL are scanned here.
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            f_sat = pool.submit(scan_rxnsat_ndc_rxnorm, sat_path)
+
+            (
+                ing_name,
+                ing_tty,
+                scdc_names,
+                unii_map,
+                scdc_set,
+                scd_names,
+                scd_set,
+                in_set,
+                pin_set,
+                min_set,
+                gpck_names,
+                gpck_set,
+                bpck_names,
+                bpck_set,
+                sbd_names,
+                sbd_set,
+                bn_names,
+                bn_set,
+            ) = scan_rxnconso(input_path, only_eng=only_eng)
+
+            ing_set = set(ing_name)
+            # All RXNREL-derived maps in a single pass over the file
+            (
+                ing_to_scdc,
+                scdc_to_scds,
+                pin_to_scdc,
+                min_to_scdc,
+                scd_to_gpck,
+                scd_to_bpck,
+                scd_to_sbd,
+                sbd_to_bn,
+            ) = scan_rxnrel_all(
+                rel_path, in_set, pin_set, min_set, scdc_set, scd_set, gpck_set, bpck_set, sbd_set, bn_set
+            )
+
+            # RXNORM NDCs from RXNSAT
+            cui_to_ndcs = f_sat.result()
 
         # unify cui -> scdc set
-        cui_to_scdc: Dict[str, Set[str]] = {}
+        cui_to_scdc: Dict[int, Set[int]] = {}
         for cui in ing_set:
             if cui in in_set:
                 cui_to_scdc[cui] = ing_to_scdc.get(cui, set())
@@ -637,68 +733,81 @@ def main() -> int:
                 cui_to_scdc[cui] = set()
 
         # Assemble final records with at least one SCDC, sorted by ingredient name
-        output: List[Dict[str, Any]] = []
-        for cui, meta in ingredients.items():
-            name = meta["name"]
-            tty = meta["tty"]
-            scdc_ids = sorted(cui_to_scdc.get(cui, set()), key=lambda x: scdc_names.get(x, ""))
-            if not scdc_ids:
-                continue  # skip ingredients with no SCDCs
-            scdcs = []
-            for sc in scdc_ids:
-                # collect SCDs for this SCDC
-                scd_ids = sorted(scdc_to_scds.get(sc, set()), key=lambda x: scd_names.get(x, ""))
-                scds = []
-                for s in scd_ids:
-                    gpcks = [{"Name": gpck_names.get(g, ""), "RXCUI": g, "TTY": "GPCK"} for g in sorted(scd_to_gpck.get(s, set()), key=lambda x: gpck_names.get(x, ""))]
-                    bpcks = [{"Name": bpck_names.get(b, ""), "RXCUI": b, "TTY": "BPCK"} for b in sorted(scd_to_bpck.get(s, set()), key=lambda x: bpck_names.get(x, ""))]
-                    # Build SBD objects including optional BNs and NDCs
-                    sbds = []
-                    for b in sorted(scd_to_sbd.get(s, set()), key=lambda x: sbd_names.get(x, "")):
-                        sbd_obj = {"Name": sbd_names.get(b, ""), "RXCUI": b, "TTY": "SBD"}
-                        ndcs_s = sorted(cui_to_ndcs.get(b, set()))
-                        if ndcs_s:
-                            sbd_obj["NDCs"] = ndcs_s
-                        bn_ids = sorted(sbd_to_bn.get(b, set()), key=lambda x: bn_names.get(x, ""))
-                        if bn_ids:
-                            sbd_obj["BNs"] = [{"Name": bn_names.get(bn, ""), "RXCUI": bn, "TTY": "BN"} for bn in bn_ids]
-                        sbds.append(sbd_obj)
-                    scd_obj = {"Name": scd_names.get(s, ""), "RXCUI": s, "TTY": "SCD"}
-                    # attach RXNORM NDCs if present for SCD
-                    ndcs = sorted(cui_to_ndcs.get(s, set()))
-                    if ndcs:
-                        scd_obj["NDCs"] = ndcs
-                    if gpcks:
-                        # add NDCs for GPCKs if present
-                        for obj in gpcks:
-                            ndcs_g = sorted(cui_to_ndcs.get(obj["RXCUI"], set()))
+        def iter_records() -> Iterator[Dict[str, Any]]:
+            for cui, name in ing_name.items():
+                tty = ing_tty[cui]
+                scdc_ids = sorted(cui_to_scdc.get(cui, set()), key=scdc_names.__getitem__)
+                if not scdc_ids:
+                    continue  # skip ingredients with no SCDCs
+                scdcs = []
+                for sc in scdc_ids:
+                    # collect SCDs for this SCDC
+                    scd_ids = sorted(scdc_to_scds.get(sc, set()), key=scd_names.__getitem__)
+                    scds = []
+                    for s in scd_ids:
+                        # Pack objects with NDCs if present
+                        gpcks = []
+                        for g in sorted(scd_to_gpck.get(s, set()), key=gpck_names.__getitem__):
+                            obj = {"Name": gpck_names[g], "RXCUI": str(g), "TTY": "GPCK"}
+                            ndcs_g = cui_to_ndcs.get(g)
                             if ndcs_g:
                                 obj["NDCs"] = ndcs_g
-                        scd_obj["GPCKs"] = gpcks
-                    if bpcks:
-                        for obj in bpcks:
-                            ndcs_b = sorted(cui_to_ndcs.get(obj["RXCUI"], set()))
+                            gpcks.append(obj)
+                        bpcks = []
+                        for b in sorted(scd_to_bpck.get(s, set()), key=bpck_names.__getitem__):
+                            obj = {"Name": bpck_names[b], "RXCUI": str(b), "TTY": "BPCK"}
+                            ndcs_b = cui_to_ndcs.get(b)
                             if ndcs_b:
                                 obj["NDCs"] = ndcs_b
-                        scd_obj["BPCKs"] = bpcks
-                    if sbds:
-                        scd_obj["SBDs"] = sbds
-                    scds.append(scd_obj)
-                scdcs.append({"Name": scdc_names.get(sc, ""), "RXCUI": sc, "TTY": "SCDC", "SCDs": scds})
-            unii = unii_map.get(cui)
-            top = {
-                "Name": name,
-                "RXCUI": cui,
-                "TTY": tty,
-                "SCDCs": scdcs,
-            }
-            if unii:
-                top["UNII"] = unii
-            output.append(top)
-
-        output.sort(key=lambda r: (r.get("Name") or "").lower())
-        write_json(output, output_path, ndjson=False)
-        write_web_split(output, web_split_dir)
+                            bpcks.append(obj)
+                        # Build SBD objects including optional BNs and NDCs
+                        sbds = []
+                        for b in sorted(scd_to_sbd.get(s, set()), key=sbd_names.__getitem__):
+                            sbd_obj = {"Name": sbd_names[b], "RXCUI": str(b), "TTY": "SBD"}
+                            ndcs_s = cui_to_ndcs.get(b)
+                            if ndcs_s:
+                                sbd_obj["NDCs"] = ndcs_s
+                            bn_ids = sorted(sbd_to_bn.get(b, set()), key=bn_names.__getitem__)
+                            if bn_ids:
+                                sbd_obj["BNs"] = [{"Name": bn_names[bn], "RXCUI": str(bn), "TTY": "BN"} for bn in bn_ids]
+                            sbds.append(sbd_obj)
+                        scd_obj = {"Name": scd_names[s], "RXCUI": str(s), "TTY": "SCD"}
+                        # attach RXNORM NDCs if present for SCD
+                        ndcs = cui_to_ndcs.get(s)
+                        if ndcs:
+                            scd_obj["NDCs"] = ndcs
+                        if gpcks:
+                            scd_obj["GPCKs"] = gpcks
+                        if bpcks:
+                            scd_obj["BPCKs"] = bpcks
+                        if sbds:
+                            scd_obj["SBDs"] = sbds
+                        scds.append(scd_obj)
+                    scdcs.append({"Name": scdc_names[sc], "RXCUI": str(sc), "TTY": "SCDC", "SCDs": scds})
+                unii = unii_map.get(cui)
+                top = {
+                    "Name": name,
+                    "RXCUI": str(cui),
+                    "TTY": tty,
+                    "SCDCs": scdcs,
+                }
+                if unii:
+                    top["UNII"] = unii
+                yield top
+
+        # Bucket records for the web split as they are built; each bucket is sorted
+        # on its own and the main JSON is a merge of the sorted buckets.
+        buckets: DefaultDict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for rec in iter_records():
+            buckets[web_bucket_key(rec["Name"] or "")].append(rec)
+        for arr in buckets.values():
+            arr.sort(key=record_sort_key)
+        # Names outside A-Z share the '0-9' bucket but sort both before 'a' and after 'z',
+        # so the buckets are merged rather than concatenated.
+        write_json_array_streaming(
+            heapq.merge(*(buckets[k] for k in sorted(buckets)), key=record_sort_key), output_path
+        )
+        write_web_split(buckets, web_split_dir)
         print(f"Wrote {output_path} and web assets in {web_split_dir}/", file=sys.stderr)
 
         # Serve the web UI and open in browser